@@ -3,14 +3,10 @@
 # Requirements: streamlit==1.38.0, supabase==2.3.3, httpx==0.25.2, numpy, pandas, openpyxl, reportlab, altair
 
 import streamlit as st
-import json
-import itertools
 import numpy as np
 import pandas as pd
 from io import BytesIO
 from datetime import datetime
-import hashlib
-import os
 import zipfile  # <-- baru: untuk mengemas PDF ke ZIP
 from reportlab.lib.utils import simpleSplit
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
@@ -18,7 +14,8 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 
 
-from supabase import create_client
+from ahp_core import *
+from db import *
 
 # PDF libs (optional)
 try:
@@ -30,41 +27,15 @@ except Exception:
     A4 = None
     mm = None
 
-from openpyxl import Workbook
-
 st.set_page_config(page_title="AHP Multi-User (Supabase)", layout="wide")
 
 # -------------------------
-# Supabase setup & check
+# Supabase secrets check (client: db.get_supabase)
 # -------------------------
 if "SUPABASE_URL" not in st.secrets or "SUPABASE_KEY" not in st.secrets:
     st.warning("Supabase secrets belum dikonfigurasi. Tambahkan SUPABASE_URL dan SUPABASE_KEY (service_role) di Streamlit Secrets.")
     st.stop()
 
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# ------------------------------
-# Utility: Excel writer (openpyxl)
-# ------------------------------
-def to_excel_bytes(df_dict):
-    wb = Workbook()
-    # remove default sheet
-    default = wb.active
-    wb.remove(default)
-    for sheet_name, df in df_dict.items():
-        if not isinstance(df, pd.DataFrame):
-            df = pd.DataFrame(df)
-        ws = wb.create_sheet(sheet_name[:31])
-        ws.append(list(df.columns))
-        for row in df.itertuples(index=False, name=None):
-            ws.append(list(row))
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
-
 # ------------------------------
 # Config / Data
 # ------------------------------
@@ -123,60 +94,9 @@ SUBCRITERIA = {
 
 }
 
-
-RI_DICT = {1:0.0,2:0.0,3:0.58,4:0.90,5:1.12,6:1.24,7:1.32,8:1.41,9:1.45,10:1.49}
-
-# ------------------------------
-# Auth helpers (PBKDF2)
-# ------------------------------
-def hash_password(password, salt=None):
-    if salt is None:
-        salt = os.urandom(16)
-    else:
-        salt = bytes.fromhex(salt)
-    dk = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 200000)
-    return salt.hex(), dk.hex()
-
-
-def verify_password(password, salt_hex, hash_hex):
-    salt = bytes.fromhex(salt_hex)
-    dk = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 200000)
-    return dk.hex() == hash_hex
-
-# ------------------------------
-# AHP core functions
-# ------------------------------
-
-def build_matrix_from_pairs(items, pair_values):
-    n = len(items)
-    M = np.ones((n, n), dtype=float)
-    idx = {it: i for i, it in enumerate(items)}
-    for (a, b), val in pair_values.items():
-        if a not in idx or b not in idx:
-            continue
-        i = idx[a]; j = idx[b]
-        M[i, j] = float(val)
-        if float(val) != 0:
-            M[j, i] = 1.0 / float(val)
-    return M
-
-
-def geometric_mean_weights(mat):
-    n = mat.shape[0]
-    # handle potential zeros or negative values defensively
-    gm = np.prod(mat, axis=1) ** (1.0 / n)
-    w = gm / gm.sum()
-    return w
-
-
-def consistency_metrics(mat, weights):
-    n = mat.shape[0]
-    Aw = mat.dot(weights)
-    lambda_max = float(np.mean(Aw / weights))
-    CI = (lambda_max - n) / (n - 1) if n > 1 else 0.0
-    RI = RI_DICT.get(n, 1.49)
-    CR = CI / RI if RI != 0 else 0.0
-    return {"lambda_max": lambda_max, "CI": CI, "CR": CR}
+# indeks pasangan (i < j) per matriks; dihitung sekali per proses di ahp_core.pair_indices
+TRI_I, TRI_J = pair_indices(len(CRITERIA))
+SUB_TRI = {group: pair_indices(len(items)) for group, items in SUBCRITERIA.items()}
 
 # ------------------------------
 # PDF generation (reportlab)
@@ -294,112 +214,6 @@ def generate_pdf_bytes(submission_row):
     buffer.seek(0)
     return buffer
 
-# ------------------------------
-# Supabase-backed DB operations (with job_items)
-# ------------------------------
-
-def register_user(username, password, is_admin=False, job_items=""):
-    if not username or not password:
-        return False, "Username dan password wajib diisi."
-    salt, pw_hash = hash_password(password)
-    # normalize job_items to string (comma-separated)
-    if isinstance(job_items, list):
-        ji = ", ".join(job_items)
-    else:
-        ji = str(job_items or "").strip()
-    payload = {
-        "username": username,
-        "pw_salt": salt,
-        "pw_hash": pw_hash,
-        "is_admin": is_admin,
-        "job_items": ji
-    }
-    try:
-        res = supabase.table("users").insert(payload).execute()
-        if hasattr(res, "error") and res.error:
-            return False, f"Registrasi gagal: {getattr(res.error, 'message', str(res.error))}"
-        return True, "Registrasi berhasil. Silakan login."
-    except Exception as e:
-        return False, f"Registrasi gagal: {e}"
-
-
-def authenticate_user(username, password):
-    res = supabase.table("users").select("*").eq("username", username).execute()
-    data = getattr(res, "data", res) or []
-    if len(data) == 0:
-        return False, "User tidak ditemukan."
-    user = data[0]
-    try:
-        if verify_password(password, user["pw_salt"], user["pw_hash"]):
-            return True, {
-                "id": user["id"],
-                "username": user["username"],
-                "is_admin": bool(user.get("is_admin", False)),
-                "job_items": user.get("job_items", "") or ""
-            }
-        return False, "Password salah."
-    except Exception as e:
-        return False, f"Auth error: {e}"
-
-
-def save_submission(user_id, main_pairs, sub_pairs, result):
-    payload = {
-        "user_id": user_id,
-        "timestamp": datetime.now().isoformat(),
-        "main_pairs": main_pairs,
-        "sub_pairs": sub_pairs,
-        "result_json": result
-    }
-    res = supabase.table("submissions").insert(payload).execute()
-    return getattr(res, "data", res)
-
-
-def get_user_submissions(user_id):
-    res = supabase.table("submissions").select("*").eq("user_id", user_id).order("id", desc=True).execute()
-    return getattr(res, "data", []) or []
-
-
-def delete_submission(submission_id):
-    res = supabase.table("submissions").delete().eq("id", submission_id).execute()
-    return getattr(res, "data", []) or []
-
-
-def get_all_submissions_with_user():
-    users_res = supabase.table("users").select("*").order("username", desc=False).execute()
-    users = getattr(users_res, "data", []) or []
-    all_rows = []
-    for u in users:
-        sid_res = supabase.table("submissions").select("*").eq("user_id", u["id"]).order("id", desc=True).limit(1).execute()
-        subs = getattr(sid_res, "data", []) or []
-        if subs:
-            s = subs[0]
-            all_rows.append({
-                "id": s["id"],
-                "username": u["username"],
-                "timestamp": s.get("timestamp"),
-                "result_json": s.get("result_json"),
-                "job_items": u.get("job_items", "")
-            })
-    all_rows = sorted(all_rows, key=lambda x: x["id"], reverse=True)
-    return all_rows
-
-
-def get_latest_submission_by_user(user_id):
-    res = supabase.table("submissions").select("*").eq("user_id", user_id).order("id", desc=True).limit(1).execute()
-    data = getattr(res, "data", []) or []
-    return data[0] if data else None
-
-
-def get_latest_submissions_per_user_list():
-    users_res = supabase.table("users").select("*").order("username", desc=False).execute()
-    users = getattr(users_res, "data", []) or []
-    experts = []
-    for u in users:
-        sub = get_latest_submission_by_user(u["id"])
-        if sub is not None:
-            experts.append((u["username"], sub.get("result_json"), sub.get("main_pairs"), u.get("job_items", "")))
-    return experts
-
 # ------------------------------
 # UI & Routing
 # ------------------------------
@@ -451,6 +265,15 @@ if user.get("job_items"):
     st.sidebar.markdown(f"**Job Items / Keahlian:** {user.get('job_items','')}")
 st.sidebar.markdown(f"**User:** {user['username']}  {'(admin)' if user['is_admin'] else ''}")
 
+# status penyimpanan yang berjalan di background (lihat get_pool)
+last_submit = st.session_state.get("last_submit")
+if last_submit is not None and last_submit.done():
+    del st.session_state["last_submit"]
+    if last_submit.exception() is not None:
+        st.error(f"Gagal menyimpan ke database: {last_submit.exception()}")
+    else:
+        st.toast("Hasil berhasil disimpan ke database (Supabase).")
+
 if user['is_admin']:
     page = st.sidebar.selectbox("Halaman", [
         "Isi Kuesioner",
@@ -467,54 +290,32 @@ else:
     ])
 
 
-def _short_key(prefix, a, b):
-    h = hashlib.sha1((prefix + "::" + a + "|||" + b).encode("utf-8")).hexdigest()
-    return h[:12]
-
-
-def pairwise_inputs(items, key_prefix):
-    pairs = list(itertools.combinations(items, 2))
-    out = {}
-    for (a, b) in pairs:
-        col_l, col_mid, col_r, col_scale = st.columns([6, 1, 6, 2])
-        col_l.markdown(f"<div style='white-space:normal'>{a}</div>", unsafe_allow_html=True)
-        col_r.markdown(f"<div style='white-space:normal'>{b}</div>", unsafe_allow_html=True)
-        kshort = _short_key(key_prefix, a, b)
-        direction = col_mid.radio("", ["L", "R"], index=0, key=f"{kshort}_dir", horizontal=True, label_visibility="collapsed")
-        val = col_scale.selectbox("", list(range(1, 10)), index=1, key=f"{kshort}_scale", label_visibility="collapsed")
-        if direction == "L":
-            out[(a, b)] = float(val)
-        else:
-            out[(a, b)] = float(1.0 / val)
-    return out
-
 # Page: Isi Kuesioner
 if page == "Isi Kuesioner":
     st.header("Isi Kuesioner AHP — Kriteria Penilaian Gambar Arstektur")
     st.write("Isi perbandingan berpasangan menggunakan skala 1–9. (1 = sama penting, 9 = mutlak lebih penting).")
-    st.markdown("**1) Perbandingan Kriteria Utama (A–G)**")
-    main_pairs = pairwise_inputs(CRITERIA, "MAIN")
+    st.caption("Kolom Arah: L = item kiri lebih penting, R = item kanan lebih penting.")
+    # form: edit di grid tidak memicu rerun sampai tombol simpan ditekan
+    with st.form("ahp_form"):
+        st.markdown("**1) Perbandingan Kriteria Utama (A–G)**")
+        main_pairs = pairwise_inputs(CRITERIA, (TRI_I, TRI_J), "MAIN")
 
-    st.markdown("---")
-    st.markdown("**2) Sub-Kriteria per Grup**")
-    sub_pairs = {}
-    for group in CRITERIA:
-        st.markdown(f"##### {group}")
-        sp = pairwise_inputs(SUBCRITERIA[group], key_prefix=group[:12].replace(" ", "_"))
-        sub_pairs[group] = {f"{a} ||| {b}": v for (a, b), v in sp.items()}
+        st.markdown("---")
+        st.markdown("**2) Sub-Kriteria per Grup**")
+        sub_pairs = {}
+        for gi, group in enumerate(CRITERIA):
+            st.markdown(f"##### {group}")
+            sub_pairs[group] = pairwise_inputs(SUBCRITERIA[group], SUB_TRI[group], key_prefix=f"SUB{gi}")
+
+        submitted = st.form_submit_button("Simpan hasil ke database")
 
-    if st.button("Simpan hasil ke database"):
-        main_mat = build_matrix_from_pairs(CRITERIA, main_pairs)
-        main_w = geometric_mean_weights(main_mat)
-        main_cons = consistency_metrics(main_mat, main_w)
+    if submitted:
+        main_mat, main_w, main_cons = solve_pairs(len(CRITERIA), tuple(main_pairs[2]))
 
         local = {}
         global_rows = []
         for i, group in enumerate(CRITERIA):
-            pairdict = {tuple(k.split(" ||| ")): v for k, v in sub_pairs[group].items()}
-            mat = build_matrix_from_pairs(SUBCRITERIA[group], pairdict)
-            w = geometric_mean_weights(mat)
-            cons = consistency_metrics(mat, w)
+            mat, w, cons = solve_pairs(len(SUBCRITERIA[group]), tuple(sub_pairs[group][2]))
             local[group] = {"keys": SUBCRITERIA[group], "weights": list(map(float, w)), "cons": cons}
             for sk, lw in zip(SUBCRITERIA[group], w):
                 global_rows.append({
@@ -530,11 +331,10 @@ if page == "Isi Kuesioner":
             "local": local,
             "global": global_rows
         }
-        ts = datetime.now().isoformat()
-        main_pairs_store = {f"{a} ||| {b}": v for (a, b), v in main_pairs.items()}
-        save_submission(user['id'], main_pairs_store, sub_pairs, result)
-        st.success("Hasil berhasil disimpan ke database (Supabase).")
-        st.rerun()
+        main_pairs_store = pairs_to_dict(CRITERIA, main_pairs)
+        sub_pairs_store = {group: pairs_to_dict(SUBCRITERIA[group], sub_pairs[group]) for group in CRITERIA}
+        st.session_state["last_submit"] = get_pool().submit(save_submission, user['id'], main_pairs_store, sub_pairs_store, result)
+        st.info("Hasil sedang disimpan ke database (Supabase)...")
 
 # Page: My Submissions
 elif page == "My Submissions":
@@ -546,12 +346,7 @@ elif page == "My Submissions":
         for r in rows:
             sid = r.get("id")
             ts = r.get("timestamp")
-            res = r.get("result_json") if r.get("result_json") is not None else r.get("result")
-            if isinstance(res, str):
-                try:
-                    res = json.loads(res)
-                except Exception:
-                    res = {}
+            res = r.get("result_json") or r.get("result") or {}
             st.subheader(f"Submission #{sid} — {ts}")
             if user.get("job_items"):
                 st.write("**Job Items / Keahlian:** " + str(user.get("job_items","")))
@@ -599,25 +394,18 @@ elif page == "Hasil Akhir Penilaian":
         st.stop()
     sid = latest.get("id")
     ts = latest.get("timestamp")
-    res = latest.get("result_json") if latest.get("result_json") is not None else latest.get("result")
-    if isinstance(res, str):
-        try:
-            res = json.loads(res)
-        except Exception:
-            res = {}
+    res = latest.get("result_json") or latest.get("result") or {}
     if user.get("job_items"):
         st.write("**Job Items / Keahlian:** " + str(user.get("job_items","")))
     st.subheader("1. Bobot Kriteria Utama")
-    df_main = pd.DataFrame({"Kriteria": res['main']['keys'], "Bobot": res['main']['weights']})
-    st.table(df_main)
+    st.table({"Kriteria": res['main']['keys'], "Bobot": [f"{w:.4f}" for w in res['main']['weights']]})
     st.write("**CI = {:.4f}, CR = {:.4f}**".format(res['main']['cons'].get('CI', 0), res['main']['cons'].get('CR', 0)))
 
     st.markdown("---")
     st.subheader("2. Bobot Sub-Kriteria (Bobot Lokal per Grup)")
     for group_name, info in res.get("local", {}).items():
         st.markdown(f"#### {group_name}")
-        df_local = pd.DataFrame({"Sub-Kriteria": info.get("keys", []), "Bobot Lokal": info.get("weights", [])})
-        st.table(df_local)
+        st.table({"Sub-Kriteria": info.get("keys", []), "Bobot Lokal": [f"{w:.4f}" for w in info.get("weights", [])]})
         st.write("**CI = {:.4f}, CR = {:.4f}**".format(info.get("cons", {}).get("CI", 0), info.get("cons", {}).get("CR", 0)))
 
     st.markdown("---")
@@ -674,12 +462,7 @@ elif page == "Admin Panel" and user["is_admin"]:
         username = r.get("username")
         ts = r.get("timestamp")
         job_items = r.get("job_items", "")
-        res = r.get("result_json") if r.get("result_json") is not None else r.get("result")
-        if isinstance(res, str):
-            try:
-                res = json.loads(res)
-            except Exception:
-                res = {}
+        res = r.get("result_json") or r.get("result") or {}
         main_weights = res.get("main", {}).get("weights", [])
         cr_main = res.get("main", {}).get("cons", {}).get("CR", 0)
         summary_rows.append({
@@ -695,8 +478,11 @@ elif page == "Admin Panel" and user["is_admin"]:
 
     st.markdown("---")
     st.subheader("🗑 Hapus Submission")
-    del_id = st.number_input("Masukkan ID submission yang ingin dihapus", min_value=1, step=1)
-    if st.button("Hapus Submission"):
+    # di dalam form: mengetik ID tidak memicu rerun (dan generate Excel/PDF ulang) sebelum tombol ditekan
+    with st.form("delete_form"):
+        del_id = st.number_input("Masukkan ID submission yang ingin dihapus", min_value=1, step=1)
+        hapus = st.form_submit_button("Hapus Submission")
+    if hapus:
         try:
             delete_submission(int(del_id))
             st.success(f"Submission #{del_id} telah dihapus.")
@@ -709,13 +495,8 @@ elif page == "Admin Panel" and user["is_admin"]:
     excel_sheets = {"Ringkasan_Admin": df_summary}
     for r in all_rows:
         sid = r.get("id")
-        res = r.get("result_json") if r.get("result_json") is not None else r.get("result")
+        res = r.get("result_json") or r.get("result") or {}
         job_items = r.get("job_items", "")
-        if isinstance(res, str):
-            try:
-                res = json.loads(res)
-            except Exception:
-                res = {}
         df_main = pd.DataFrame({"Kriteria": res.get("main", {}).get("keys", []),
                                 "Bobot": res.get("main", {}).get("weights", [])})
         df_global = pd.DataFrame(res.get("global", [])).sort_values("GlobalWeight", ascending=False)
@@ -743,12 +524,7 @@ elif page == "Admin Panel" and user["is_admin"]:
         username = r.get("username")
         ts = r.get("timestamp")
         job_items = r.get("job_items", "")
-        res = r.get("result_json") if r.get("result_json") is not None else r.get("result")
-        if isinstance(res, str):
-            try:
-                res = json.loads(res)
-            except Exception:
-                res = {}
+        res = r.get("result_json") or r.get("result") or {}
 
         st.markdown(f"**#{sid} — {username}**  _{ts}_  | Job Items: {job_items}")
         cols = st.columns([1,1,1,6])
@@ -824,27 +600,23 @@ elif page == "Laporan Final Gabungan Pakar" and user["is_admin"]:
     st.success(f"Ditemukan {len(experts)} pakar (menggunakan submission terbaru tiap pakar).")
 
     # 1) AIJ — aggregate pairwise matrices (main criteria)
-    all_main_matrices = []
+    # nilai pasangan semua pakar ditumpuk (K, n, n) di ruang log, tanpa loop per matriks
+    n_main = len(CRITERIA)
+    pair_keys = [f"{CRITERIA[i]} ||| {CRITERIA[j]}" for i, j in zip(TRI_I, TRI_J)]
+    codes = np.ones((len(experts), len(pair_keys)), dtype=np.int8)
     expert_meta = []
-    for username, rjson, main_pairs_json, job_items in experts:
+    for k, (username, rjson, main_pairs_json, job_items) in enumerate(experts):
         expert_meta.append({"username": username, "job_items": job_items})
-        mp = {}
-        try:
-            mp = main_pairs_json if isinstance(main_pairs_json, dict) else json.loads(main_pairs_json)
-        except Exception:
-            mp = {}
-        pair_values = {}
-        for k, v in (mp.items() if isinstance(mp, dict) else []):
-            try:
-                a, b = [s.strip() for s in k.split("|||")]
-                pair_values[(a, b)] = float(v)
-            except Exception:
-                continue
-        M = build_matrix_from_pairs(CRITERIA, pair_values)
-        all_main_matrices.append(M)
-
-    GM = np.exp(np.mean([np.log(m) for m in all_main_matrices], axis=0))
-    weights_aij = geometric_mean_weights(GM)
+        mp = main_pairs_json or {}
+        codes[k] = scale_codes([mp.get(key, 1) for key in pair_keys])
+
+    log_vals = np.take(LOG_LUT, codes + 9)
+    log_M = np.zeros((len(experts), n_main, n_main))
+    log_M[:, TRI_I, TRI_J] = log_vals
+    log_M[:, TRI_J, TRI_I] = -log_vals
+    log_GM = log_M.mean(axis=0)
+    GM = np.exp(log_GM)
+    weights_aij = log_geometric_mean_weights(log_GM)
     cons_aij = consistency_metrics(GM, weights_aij)
     df_aij = pd.DataFrame({"Kriteria": CRITERIA, "Bobot_AI J": weights_aij})
     st.subheader("1) Bobot Gabungan Kriteria Utama (AIJ)")
@@ -854,10 +626,7 @@ elif page == "Laporan Final Gabungan Pakar" and user["is_admin"]:
     # 2) AIP — aggregate individual priorities
     all_w = []
     for username, rjson, _, _ in experts:
-        try:
-            res = rjson if isinstance(rjson, dict) else json.loads(rjson)
-        except Exception:
-            res = {}
+        res = rjson or {}
         all_w.append(np.array(res.get("main", {}).get("weights", [])))
     all_w = np.vstack(all_w)
     w_aip = np.exp(np.mean(np.log(all_w), axis=0))
@@ -872,10 +641,7 @@ elif page == "Laporan Final Gabungan Pakar" and user["is_admin"]:
     for group in CRITERIA:
         collects = []
         for username, rjson, _, _ in experts:
-            try:
-                res = rjson if isinstance(rjson, dict) else json.loads(rjson)
-            except Exception:
-                res = {}
+            res = rjson or {}
             lw = res.get("local", {}).get(group, {}).get("weights", [])
             if lw:
                 collects.append(np.array(lw))
@@ -0,0 +1,195 @@
+# ahp_core.py
+# Fungsi AHP bersama untuk KriteriaAHP.py & disertasiAHP.py: matriks perbandingan, bobot, konsistensi,
+# hash password dan export Excel.
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+from io import BytesIO
+import hashlib
+import hmac
+import functools
+import os
+
+from openpyxl import Workbook
+
+__all__ = [
+    "RI", "SCALE_LUT", "LOG_LUT",
+    "hash_password", "verify_password", "dummy_verify",
+    "pair_indices", "build_matrix", "scale_codes", "pairs_to_dict", "geometric_mean_weights", "log_geometric_mean_weights",
+    "consistency_metrics", "ahp_solve", "solve_pairs", "pairwise_inputs", "to_excel_bytes",
+]
+
+# Random Index Saaty, indeks = n s.d. 15 (n > 15 memakai nilai terakhir)
+RI = (0.0, 0.0, 0.0, 0.58, 0.90, 1.12, 1.24, 1.32, 1.41, 1.45, 1.49, 1.51, 1.48, 1.56, 1.57, 1.59)
+
+# kode skala Saaty c ∈ [-9, -2] ∪ [1, 9]: c > 0 berarti nilai c, c < 0 berarti 1/|c|; indeks = c + 9
+SCALE_LUT = np.array([1.0 / -c if c < -1 else (float(c) if c > 0 else 1.0) for c in range(-9, 10)])
+LOG_LUT = np.log(SCALE_LUT)
+
+
+# ------------------------------
+# Utility: Excel writer (openpyxl)
+# ------------------------------
+def to_excel_bytes(df_dict):
+    # write-only: baris di-stream ke file, tanpa menyimpan objek Cell per sel
+    wb = Workbook(write_only=True)
+    for sheet_name, df in df_dict.items():
+        if not isinstance(df, pd.DataFrame):
+            df = pd.DataFrame(df)
+        ws = wb.create_sheet(sheet_name[:31])
+        ws.append(df.columns.tolist())
+        for row in df.to_numpy().tolist():
+            ws.append(row)
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+# ------------------------------
+# Auth helpers (scrypt; PBKDF2 untuk hash lama)
+# ------------------------------
+PBKDF2_ITERATIONS = 200000
+SCRYPT_PREFIX = "scrypt$"  # pw_hash baru disimpan sebagai "scrypt$<hex>"
+
+
+def _kdf(password_bytes, salt, kdf):
+    if kdf == "scrypt":
+        return hashlib.scrypt(password_bytes, salt=salt, n=16384, r=8, p=1, dklen=32)
+    return hashlib.pbkdf2_hmac('sha256', password_bytes, salt, PBKDF2_ITERATIONS)
+
+
+def hash_password(password, salt=None):
+    if salt is None:
+        salt = os.urandom(16)
+    else:
+        salt = bytes.fromhex(salt)
+    dk = _kdf(password.encode('utf-8'), salt, "scrypt")
+    return salt.hex(), SCRYPT_PREFIX + dk.hex()
+
+
+def verify_password(password, salt_hex, hash_hex):
+    # tanpa cache (password tidak disimpan di memori proses); cukup sekali per login karena
+    # user yang sudah masuk disimpan di st.session_state['user']
+    salt = bytes.fromhex(salt_hex)
+    if hash_hex.startswith(SCRYPT_PREFIX):
+        dk = _kdf(password.encode('utf-8'), salt, "scrypt")
+        return hmac.compare_digest(SCRYPT_PREFIX + dk.hex(), hash_hex)
+    dk = _kdf(password.encode('utf-8'), salt, "pbkdf2")
+    return hmac.compare_digest(dk.hex(), hash_hex)
+
+
+def dummy_verify(password):
+    # untuk username yang tidak ada: KDF tanpa cache dengan biaya seperti baris tersimpan pada umumnya
+    # (PBKDF2 selama hash lama masih ada) agar waktu respons tidak membedakan user yang tidak ada
+    _kdf(password.encode('utf-8'), os.urandom(16), "pbkdf2")
+    return False
+
+# ------------------------------
+# AHP core functions
+# ------------------------------
+
+@functools.lru_cache(maxsize=None)
+def pair_indices(n):
+    # indeks pasangan (i < j) untuk matriks n x n; modul ini di-import sekali per proses,
+    # jadi rerun halaman hanya membaca cache (array read-only karena dipakai bersama)
+    i_idx, j_idx = np.triu_indices(n, 1)
+    i_idx.flags.writeable = False
+    j_idx.flags.writeable = False
+    return i_idx, j_idx
+
+
+def build_matrix(n, i_idx, j_idx, vals):
+    vals = np.asarray(vals, dtype=float)
+    M = np.ones((n, n), dtype=float)
+    M[i_idx, j_idx] = vals
+    M[j_idx, i_idx] = np.reciprocal(vals)
+    return M
+
+
+def scale_codes(vals):
+    # nilai 1/k (termasuk format simpan lama, mis. 0.333) -> kode -k; kode yang sudah int tetap
+    v = np.asarray(vals, dtype=float)
+    return np.rint(np.where((v > 0) & (v < 1), -1.0 / v, v)).astype(np.int8)
+
+
+def pairs_to_dict(items, pairs):
+    # format simpan: {"A ||| B": kode skala}
+    i_idx, j_idx, vals = pairs
+    return {f"{items[i]} ||| {items[j]}": int(c) for i, j, c in zip(i_idx, j_idx, scale_codes(vals))}
+
+
+def geometric_mean_weights(mat):
+    return log_geometric_mean_weights(np.log(mat))
+
+
+def log_geometric_mean_weights(log_mat):
+    # rata-rata baris di ruang log: stabil (tanpa overflow/underflow dari np.prod)
+    gm = np.exp(log_mat.mean(axis=1))
+    return gm / gm.sum()
+
+
+def consistency_metrics(mat, weights):
+    n = mat.shape[0]
+    Aw = mat.dot(weights)
+    lambda_max = float(np.mean(Aw / weights))
+    CI = (lambda_max - n) / (n - 1) if n > 1 else 0.0
+    CR = CI / RI[min(n, len(RI) - 1)] if n >= 3 else 0.0
+    return {"lambda_max": lambda_max, "CI": CI, "CR": CR}
+
+
+def ahp_solve(i_idx, j_idx, vals, n):
+    vals = np.asarray(vals, dtype=np.float64)
+    M = build_matrix(n, i_idx, j_idx, vals)
+    if n < 3:
+        # n = 1/2 selalu konsisten (CR = 0); bobot 2x2 bentuk tertutup [a, 1] / (a + 1)
+        w = np.array([vals[0], 1.0]) / (vals[0] + 1.0) if n == 2 else np.ones(n)
+        return M, w, {"lambda_max": float(n), "CI": 0.0, "CR": 0.0}
+    w = geometric_mean_weights(M)
+    return M, w, consistency_metrics(M, w)
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60, max_entries=256)
+def solve_pairs(n, vals):
+    # vals = tuple nilai pasangan dalam urutan pair_indices(n); kunci cache (n, vals) menentukan hasil sepenuhnya
+    i_idx, j_idx = pair_indices(n)
+    return ahp_solve(i_idx, j_idx, np.asarray(vals, dtype=np.float64), n)
+
+# ------------------------------
+# Input perbandingan berpasangan (UI)
+# ------------------------------
+
+# dibuat sekali saat import, dipakai ulang oleh semua grid (skala Saaty 1-9 + arah L/R)
+PAIR_COLUMN_CONFIG = {
+    "Kiri": st.column_config.TextColumn("Kiri", width="large"),
+    "Arah": st.column_config.SelectboxColumn("Arah", options=["L", "R"], required=True),
+    "Kanan": st.column_config.TextColumn("Kanan", width="large"),
+    "Skala": st.column_config.NumberColumn("Skala", min_value=1, max_value=9, step=1, required=True),
+}
+
+# label Kiri/Kanan per grup: tuple(items) -> (kiri, kanan), dibuat sekali dari tri milik halaman
+_PAIR_LABELS = {}
+
+def pairwise_inputs(items, tri, key_prefix):
+    # satu grid st.data_editor per grup (bukan 4 widget per pasangan)
+    i_idx, j_idx = tri
+    labels_key = tuple(items)
+    if labels_key not in _PAIR_LABELS:
+        _PAIR_LABELS[labels_key] = (tuple(items[i] for i in i_idx), tuple(items[j] for j in j_idx))
+    left, right = _PAIR_LABELS[labels_key]
+    grid = pd.DataFrame({
+        "Kiri": left,
+        "Arah": ["L"] * len(i_idx),
+        "Kanan": right,
+        "Skala": [2] * len(i_idx),
+    })
+    edited = st.data_editor(
+        grid,
+        column_config=PAIR_COLUMN_CONFIG,
+        disabled=["Kiri", "Kanan"],
+        hide_index=True,
+        use_container_width=True,
+        key=f"{key_prefix}_grid",
+    )
+    scale = edited["Skala"].fillna(2).to_numpy(dtype=float)
+    vals = np.where(edited["Arah"].to_numpy() == "R", 1.0 / scale, scale)
+    return i_idx, j_idx, vals
@@ -0,0 +1,150 @@
+# db.py
+# Akses Supabase bersama untuk KriteriaAHP.py & disertasiAHP.py (satu client per proses).
+
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+
+from supabase import create_client
+
+from ahp_core import hash_password, verify_password, dummy_verify
+
+__all__ = [
+    "get_supabase", "get_pool",
+    "register_user", "authenticate_user", "save_submission", "get_user_submissions", "delete_submission",
+    "get_all_submissions_with_user", "get_latest_submission_by_user", "get_latest_submissions_per_user_list",
+]
+
+
+@st.cache_resource
+def get_supabase():
+    # satu client (dan koneksi HTTPS) untuk semua rerun/sesi
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+
+
+@st.cache_resource
+def get_pool():
+    # worker untuk insert ke Supabase agar UI tidak menunggu round trip HTTPS
+    return ThreadPoolExecutor(max_workers=4)
+
+# ------------------------------
+# Supabase-backed DB operations (with job_items)
+# ------------------------------
+
+def register_user(username, password, is_admin=False, job_items=""):
+    if not username or not password:
+        return False, "Username dan password wajib diisi."
+    salt, pw_hash = hash_password(password)
+    # normalize job_items to string (comma-separated)
+    if isinstance(job_items, list):
+        ji = ", ".join(job_items)
+    else:
+        ji = str(job_items or "").strip()
+    payload = {
+        "username": username,
+        "pw_salt": salt,
+        "pw_hash": pw_hash,
+        "is_admin": is_admin,
+        "job_items": ji
+    }
+    try:
+        res = get_supabase().table("users").insert(payload).execute()
+        if hasattr(res, "error") and res.error:
+            return False, f"Registrasi gagal: {getattr(res.error, 'message', str(res.error))}"
+        get_user_row.clear()
+        return True, "Registrasi berhasil. Silakan login."
+    except Exception as e:
+        return False, f"Registrasi gagal: {e}"
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_user_row(username):
+    res = get_supabase().table("users").select("id,username,pw_salt,pw_hash,is_admin,job_items").eq("username", username).execute()
+    return getattr(res, "data", res) or []
+
+
+def authenticate_user(username, password):
+    data = get_user_row(username)
+    if len(data) == 0:
+        dummy_verify(password)
+        return False, "User tidak ditemukan."
+    user = data[0]
+    try:
+        if verify_password(password, user["pw_salt"], user["pw_hash"]):
+            return True, {
+                "id": user["id"],
+                "username": user["username"],
+                "is_admin": bool(user.get("is_admin", False)),
+                "job_items": user.get("job_items", "") or ""
+            }
+        return False, "Password salah."
+    except Exception as e:
+        return False, f"Auth error: {e}"
+
+
+def save_submission(user_id, main_pairs, sub_pairs, result):
+    payload = {
+        "user_id": user_id,
+        "main_pairs": main_pairs,
+        "sub_pairs": sub_pairs,
+        "result_json": result
+    }
+    res = get_supabase().table("submissions").insert(payload).execute()
+    clear_submission_cache()
+    return getattr(res, "data", res)
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def get_user_submissions(user_id):
+    res = get_supabase().table("submissions").select("id,timestamp,result_json,result").eq("user_id", user_id).order("id", desc=True).limit(50).execute()
+    return getattr(res, "data", []) or []
+
+
+def delete_submission(submission_id):
+    res = get_supabase().table("submissions").delete().eq("id", submission_id).execute()
+    clear_submission_cache()
+    return getattr(res, "data", []) or []
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_latest_submissions_with_user():
+    # satu query ke view latest_submission_per_user (lihat README) + embed users
+    res = get_supabase().table("latest_submission_per_user").select("id,timestamp,result_json,result,main_pairs,users(username,job_items)").order("id", desc=True).execute()
+    return getattr(res, "data", []) or []
+
+
+def get_all_submissions_with_user():
+    all_rows = []
+    for s in get_latest_submissions_with_user():
+        u = s.get("users") or {}
+        all_rows.append({
+            "id": s["id"],
+            "username": u.get("username"),
+            "timestamp": s.get("timestamp"),
+            "result_json": s.get("result_json"),
+            "result": s.get("result"),
+            "job_items": u.get("job_items", "")
+        })
+    return all_rows
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_latest_submission_by_user(user_id):
+    res = get_supabase().table("submissions").select("id,timestamp,result_json,result").eq("user_id", user_id).order("id", desc=True).limit(1).execute()
+    data = getattr(res, "data", []) or []
+    return data[0] if data else None
+
+
+def get_latest_submissions_per_user_list():
+    experts = []
+    for s in get_latest_submissions_with_user():
+        u = s.get("users") or {}
+        # baris lama: hasil masih di kolom "result" (result_json kosong)
+        experts.append((u.get("username", ""), s.get("result_json") or s.get("result"), s.get("main_pairs"), u.get("job_items", "")))
+    return sorted(experts, key=lambda x: x[0])
+
+
+def clear_submission_cache():
+    # dipanggil setelah insert/delete agar halaman hasil tidak menampilkan data lama
+    get_latest_submissions_with_user.clear()
+    get_latest_submission_by_user.clear()
+    get_user_submissions.clear()